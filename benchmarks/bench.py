@@ -0,0 +1,343 @@
+"""
+Benchmarks for the logos_shift_client hot paths.
+
+Each case runs in a fresh interpreter so the process-wide pipeline_registry,
+its shared sending thread and import caches do not leak from one case into
+the next.
+Results are written as JSON so they can be diffed between releases.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --only startup decorator router
+    python benchmarks/bench.py --output bench_output.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+REPEAT = 5
+CALLS = 20_000
+THREAD_COUNTS = (1, 2, 4, 8, 16)
+CAPTURES_PER_THREAD = 5_000
+FLUSH_RECORDS = 200
+FLUSH_TIMEOUT = 120  # seconds
+FLUSH_SCENARIOS = (
+    {"latency_ms": 0, "error_rate": 0.0},
+    {"latency_ms": 5, "error_rate": 0.0},
+    {"latency_ms": 0, "error_rate": 0.1},
+    {"latency_ms": 5, "error_rate": 0.1},
+)
+ROUTER_MODES = ("never", "random", "user_based")
+STARTUP_RUNS = 10
+STARTUP_SCRIPT = """
+import json, sys, threading, time
+HEAVY_MODULES = ("requests", "httpx", "asyncio")
+start = time.perf_counter()
+from logos_shift_client import LogosShift
+imported = time.perf_counter()
+logos_shift = LogosShift(api_key="bench")
+constructed = time.perf_counter()
+json.dump({
+    "import_ms": (imported - start) * 1e3,
+    "construct_ms": (constructed - imported) * 1e3,
+    "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+    "threads": threading.active_count(),
+}, sys.stdout)
+"""
+SEED = 1234
+
+
+def _quiet():
+    logging.getLogger("logos_shift_client").setLevel(logging.CRITICAL)
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def _summary(timings, calls):
+    per_call = [t / calls * 1e9 for t in timings]
+    return {
+        "calls": calls,
+        "repeat": len(timings),
+        "min_ns": round(min(per_call), 1),
+        "median_ns": round(statistics.median(per_call), 1),
+    }
+
+
+def _time_sync(func, calls=CALLS, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(calls):
+            func(i, 1)
+        timings.append(time.perf_counter() - start)
+    return _summary(timings, calls)
+
+
+def _time_async(func, calls=CALLS, repeat=REPEAT):
+    async def run():
+        start = time.perf_counter()
+        for i in range(calls):
+            await func(i, 1)
+        return time.perf_counter() - start
+
+    timings = [asyncio.run(run()) for _ in range(repeat)]
+    return _summary(timings, calls)
+
+
+def _overhead(baseline, decorated):
+    return {
+        "baseline": baseline,
+        "decorated": decorated,
+        "overhead_ns": round(decorated["median_ns"] - baseline["median_ns"], 1),
+    }
+
+
+def bench_decorator():
+    """Per-call overhead of @logos_shift() against the undecorated function."""
+    from logos_shift_client import LogosShift
+
+    # A long check interval keeps the flush thread asleep during measurement.
+    logos_shift = LogosShift(api_key=None, check_seconds=3600)
+
+    def add(x, y):
+        return {"value": x + y}
+
+    async def add_async(x, y):
+        return {"value": x + y}
+
+    return {
+        "sync": _overhead(_time_sync(add), _time_sync(logos_shift()(add))),
+        "async": _overhead(
+            _time_async(add_async), _time_async(logos_shift()(add_async))
+        ),
+    }
+
+
+def bench_capture():
+    """handle_data throughput as the number of capturing threads grows."""
+    from logos_shift_client import LogosShift
+
+    logos_shift = LogosShift(api_key=None, check_seconds=3600)
+    results = {}
+    for thread_count in THREAD_COUNTS:
+        barrier = threading.Barrier(thread_count + 1)
+
+        def worker(barrier):
+            barrier.wait()
+            for i in range(CAPTURES_PER_THREAD):
+                logos_shift.handle_data({"value": i}, "default", (i,), {}, {})
+
+        threads = [
+            threading.Thread(target=worker, args=(barrier,))
+            for _ in range(thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        total = thread_count * CAPTURES_PER_THREAD
+        results[str(thread_count)] = {
+            "records": total,
+            "seconds": round(elapsed, 4),
+            "records_per_second": round(total / elapsed, 1),
+        }
+        logos_shift.buffer_A.clear()
+        logos_shift.buffer_B.clear()
+    return results
+
+
+class StubSink(ThreadingHTTPServer):
+    """Local stand-in for the Bohita sink with injectable latency and errors."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubSinkHandler)
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.random = random.Random(SEED)
+        self.count = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self, latency_ms, error_rate):
+        with self.lock:
+            self.latency = latency_ms / 1000
+            self.error_rate = error_rate
+            self.random.seed(SEED)
+            self.count = 0
+            self.errors = 0
+
+
+class StubSinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            failed = self.server.random.random() < self.server.error_rate
+            self.server.count += 1
+            self.server.errors += failed
+        self.send_response(500 if failed else 200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_flush():
+    """End-to-end BufferManager flush throughput against a local stub sink."""
+    from logos_shift_client import LogosShift, bohita
+
+    sink = StubSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    bohita.BASE_URL = sink.url
+    logos_shift = LogosShift(api_key="bench", check_seconds=0.05)
+
+    results = {}
+    for scenario in FLUSH_SCENARIOS:
+        sink.reset(**scenario)
+        start = time.perf_counter()
+        for i in range(FLUSH_RECORDS):
+            logos_shift.handle_data({"value": i}, "default", (i,), {}, {})
+        while sink.count < FLUSH_RECORDS:
+            if time.perf_counter() - start > FLUSH_TIMEOUT:
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        name = f"latency_{scenario['latency_ms']}ms_errors_{scenario['error_rate']}"
+        results[name] = {
+            **scenario,
+            "records": FLUSH_RECORDS,
+            "requests": sink.count,
+            "errors": sink.errors,
+            "seconds": round(elapsed, 4),
+            "records_per_second": round(sink.count / elapsed, 1),
+        }
+    sink.shutdown()
+    return results
+
+
+def bench_router():
+    """APIRouter.get_api_to_call cost for each routing mode."""
+    from logos_shift_client import APIRouter
+    from logos_shift_client.bohita import BohitaClient
+
+    random.seed(SEED)
+    bohita_client = BohitaClient(api_key=None)
+
+    def old_api():
+        pass
+
+    results = {}
+    for mode in ROUTER_MODES:
+        router = APIRouter(bohita_client=bohita_client, threshold=0.5, mode=mode)
+
+        def route(i, _, router=router):
+            return router.get_api_to_call(old_api, user_id=str(i))
+
+        results[mode] = _time_sync(route)
+    return results
+
+
+def bench_startup():
+    """Import and LogosShift construction time in a fresh interpreter."""
+    runs = []
+    for _ in range(STARTUP_RUNS):
+        proc = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        )
+        runs.append(json.loads(proc.stdout))
+
+    def ms(field):
+        values = [run[field] for run in runs]
+        return {
+            "min": round(min(values), 2),
+            "median": round(statistics.median(values), 2),
+        }
+
+    return {
+        "runs": STARTUP_RUNS,
+        "import_ms": ms("import_ms"),
+        "construct_ms": ms("construct_ms"),
+        "heavy_modules": runs[-1]["heavy_modules"],
+        "threads": runs[-1]["threads"],
+    }
+
+
+CASES = {
+    "startup": bench_startup,
+    "decorator": bench_decorator,
+    "capture": bench_capture,
+    "flush": bench_flush,
+    "router": bench_router,
+}
+
+
+def run_case(name):
+    _quiet()
+    json.dump(CASES[name](), sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), default=None)
+    parser.add_argument("--output", help="Write results to this file as well.")
+    parser.add_argument("--case", choices=sorted(CASES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case)
+        return
+
+    results = {}
+    for name in args.only or CASES:
+        print(f"Running {name}...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, __file__, "--case", name],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results[name] = json.loads(proc.stdout)
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
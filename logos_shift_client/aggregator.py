@@ -0,0 +1,222 @@
+"""
+Per-host aggregation for pre-fork servers (gunicorn, uwsgi, ...).
+
+Instead of every worker running its own upload loop against Bohita, workers
+hand their records to a single uploader process over a Unix domain socket.
+The uploader buffers records from all workers and sends them on one flush
+cycle.
+
+Start the uploader once per host:
+
+    $ BOHITA_API_KEY=... python -m logos_shift_client.aggregator --socket /tmp/logos_shift.sock
+
+and point every worker at it:
+
+    >>> logos_shift = LogosShift(api_key="YOUR_API_KEY", aggregator_socket="/tmp/logos_shift.sock")
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+from collections import deque
+
+from .bohita import TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AggregatorClient:
+    """
+    Sends records to a local aggregator over a Unix domain socket.
+
+    Records are written as newline-delimited JSON on a single connection that is
+    opened on first use and re-opened once if the aggregator has gone away. A send
+    that does not complete within timeout counts as a failure, so a stalled
+    aggregator cannot block the sending thread.
+
+    Attributes:
+        socket_path (str): The path of the aggregator's Unix domain socket.
+        timeout (float): Seconds to wait for connecting or sending.
+        sock (Optional[socket.socket]): The open connection, if any.
+    """
+
+    def __init__(self, socket_path, timeout=TIMEOUT):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        logger.debug(f"AggregatorClient: Connected to {self.socket_path}")
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def send(self, data):
+        """
+        Hands a record over to the aggregator.
+
+        Args:
+            data (dict): The record to send.
+
+        Returns:
+            bool: True if the record was written to the socket, False if the aggregator is unreachable.
+        """
+        payload = (json.dumps(data, default=str) + "\n").encode()
+        for _ in range(2):
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(payload)
+                return True
+            except OSError as e:
+                logger.warning(
+                    "Could not reach aggregator at %s: %s", self.socket_path, str(e)
+                )
+                self.close()
+        return False
+
+
+class _RecordHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                logger.error("Aggregator: Dropping malformed record")
+                continue
+            if not isinstance(data, dict) or not isinstance(data.get("dataset"), str):
+                logger.error("Aggregator: Dropping record without a dataset")
+                continue
+            self.server.aggregator.add(data)
+
+
+class Aggregator:
+    """
+    Receives records from worker processes and feeds them to a BufferManager.
+
+    Attributes:
+        socket_path (str): The path of the Unix domain socket to listen on.
+        buffer (collections.deque): Records received and not yet picked up by the buffer manager.
+        lock (threading.Lock): A lock guarding the buffer.
+        server (socketserver.ThreadingUnixStreamServer): The listening server.
+
+    Examples:
+        >>> buffer_manager = pipeline_registry.acquire(api_key="YOUR_API_KEY")
+        >>> aggregator = Aggregator("/tmp/logos_shift.sock", buffer_manager)
+        >>> aggregator.serve_forever()
+    """
+
+    def __init__(self, socket_path, buffer_manager):
+        self.socket_path = str(socket_path)
+        self.buffer, self.lock = deque(), threading.Lock()
+        self._remove_stale_socket()
+        self.server = socketserver.ThreadingUnixStreamServer(
+            self.socket_path, _RecordHandler
+        )
+        self.server.daemon_threads = True
+        self.server.aggregator = self
+        buffer_manager.register_buffer(self.buffer, self.lock)
+        from .logos_shift import pipeline_registry
+
+        pipeline_registry.ensure_started()
+        logger.info(f"Aggregator: Listening on {self.socket_path}")
+
+    def _is_socket(self):
+        """True if socket_path is a socket, False if nothing is there; raises for anything else."""
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return False
+        if not stat.S_ISSOCK(mode):
+            raise RuntimeError(f"{self.socket_path} exists and is not a socket")
+        return True
+
+    def _remove_stale_socket(self):
+        if not self._is_socket():
+            return
+        probe = AggregatorClient(self.socket_path)
+        try:
+            probe.connect()
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        probe.close()
+        raise RuntimeError(f"An aggregator is already listening on {self.socket_path}")
+
+    def add(self, data):
+        with self.lock:
+            self.buffer.append(data)
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            if self._is_socket():
+                os.unlink(self.socket_path)
+        except RuntimeError as e:
+            logger.warning("Aggregator: Not removing %s: %s", self.socket_path, str(e))
+        logger.info("Aggregator: Shut down.")
+
+
+def _exit_on_sigterm(signum, frame):
+    # Unwinds serve_forever so main() shuts down and flushes, as on Ctrl-C.
+    raise SystemExit(0)
+
+
+def main():
+    from .logos_shift import CHECK_SECONDS, pipeline_registry
+
+    parser = argparse.ArgumentParser(
+        description="Upload records from all local LogosShift workers."
+    )
+    parser.add_argument("--socket", required=True, help="Unix domain socket path.")
+    parser.add_argument(
+        "--api-key",
+        default=os.environ.get("BOHITA_API_KEY"),
+        help="Bohita API key. Defaults to $BOHITA_API_KEY.",
+    )
+    parser.add_argument("--check-seconds", type=float, default=CHECK_SECONDS)
+    parser.add_argument("--filename", help="Also store records in this local file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    buffer_manager = pipeline_registry.acquire(
+        api_key=args.api_key,
+        check_seconds=args.check_seconds,
+        filename=args.filename,
+    )
+    aggregator = Aggregator(args.socket, buffer_manager)
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        aggregator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        aggregator.shutdown()
+        pipeline_registry.release(buffer_manager)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-import requests
-import httpx
 import logging
 
 BASE_URL = "https://logos-shift-sink-6kso2cgttq-uc.a.run.app"
@@ -8,6 +6,21 @@ logger = logging.getLogger(__name__)
 
 
 class BohitaClient:
+    """
+    BohitaClient sends instrumentation data to and fetches configuration from the Bohita platform.
+
+    requests and httpx are imported on first use, so importing and constructing a
+    client stays cheap for processes that never send anything.
+
+    Attributes:
+        headers (Optional[dict]): The request headers, or None when no API key was provided and nothing is sent.
+        async_client (httpx.AsyncClient): The client used for asynchronous requests, created on first use.
+
+    Examples:
+        >>> bohita_client = BohitaClient(api_key="YOUR_API_KEY")
+        >>> bohita_client.post_instrumentation_data(data, dataset="default")
+    """
+
     def __init__(self, api_key: str):
         if api_key is None:
             logging.warning(
@@ -19,11 +32,27 @@ class BohitaClient:
                 "Content-Type": "application/json",
                 "Bohita-Auth": f"Bearer {api_key}",
             }
-        self.async_client = httpx.AsyncClient(headers=self.headers, timeout=TIMEOUT)
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import httpx
+
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers, timeout=TIMEOUT
+            )
+        return self._async_client
+
+    def reset_connections(self):
+        # Pooled connections must not be shared with a forked child.
+        self._async_client = None
 
     def post_instrumentation_data(self, data, dataset):
         if not self.headers:
             return
+        import requests
+
         try:
             response = requests.post(
                 f"{BASE_URL}/instrumentation/",
@@ -38,6 +67,8 @@ class BohitaClient:
     async def post_instrumentation_data_async(self, data, dataset):
         if not self.headers:
             return
+        import httpx
+
         try:
             response = await self.async_client.post(
                 f"{BASE_URL}/instrumentation/", json={**data, "dataset": dataset}
@@ -49,6 +80,8 @@ class BohitaClient:
     def get_config(self):
         if not self.headers:
             return {}
+        import requests
+
         try:
             response = requests.get(
                 f"{BASE_URL}/config", headers=self.headers, timeout=TIMEOUT
@@ -62,6 +95,8 @@ class BohitaClient:
     async def get_config_async(self):
         if not self.headers:
             return {}
+        import httpx
+
         try:
             response = await self.async_client.get(f"{BASE_URL}/config")
             response.raise_for_status()
@@ -73,6 +108,8 @@ class BohitaClient:
     def predict(self, **kwargs):
         if not self.headers:
             return
+        import requests
+
         try:
             response = requests.post(
                 f"{BASE_URL}/predict",
@@ -88,6 +125,8 @@ class BohitaClient:
     async def predict_async(self, **kwargs):
         if not self.headers:
             return
+        import httpx
+
         try:
             response = await self.async_client.post(f"{BASE_URL}/predict", json=kwargs)
             response.raise_for_status()
@@ -1,62 +1,93 @@
-import asyncio
+import inspect
 import logging
+import os
+import sys
 import threading
 import time
 import uuid
+import weakref
 from pathlib import Path
-from collections import deque
+from collections import OrderedDict, deque
 from typing import Optional, Union
 
-from tenacity import retry, wait_fixed
-
 from .bohita import BohitaClient
 from .router import APIRouter
 
 logger = logging.getLogger(__name__)
 MAX_ENTRIES = 10
 CHECK_SECONDS = 5
+MAX_TRACKED_IDS = 10_000
 
 
-class SingletonMeta(type):
-    _instances = {}
-    _lock = threading.Lock()
+def _is_coroutine_function(func):
+    """
+    asyncio.iscoroutinefunction without importing asyncio.
 
-    def __call__(cls, *args, **kwargs):
-        with cls._lock:
-            if cls not in cls._instances:
-                instance = super().__call__(*args, **kwargs)
-                cls._instances[cls] = instance
-        return cls._instances[cls]
+    Like asyncio's check, it also accepts callables carrying asyncio's _is_coroutine
+    marker (e.g. asgiref's markcoroutinefunction), which inspect ignores before 3.12.
+    Nothing can carry the marker until asyncio has been imported.
+    """
+    if inspect.iscoroutinefunction(func):
+        return True
+    coroutines = sys.modules.get("asyncio.coroutines")
+    marker = getattr(coroutines, "_is_coroutine", None)
+    return marker is not None and getattr(func, "_is_coroutine", None) is marker
 
 
-class BufferManager(metaclass=SingletonMeta):
+class BufferManager:
     """
-    A singleton class responsible for managing data buffers and sending data to a remote server.
+    A pipeline responsible for managing data buffers and sending data to a remote server.
+
+    One BufferManager exists per configuration and is shared by every LogosShift
+    instance with that configuration. Use pipeline_registry.acquire to get one; the
+    registry's thread calls flush every check_seconds.
 
     Attributes:
         bohita_client: An instance of BohitaClient used to send data to the remote server.
         check_seconds: The interval in seconds between checks to send data from the buffers.
         filepath: The file path for local data storage. If None, data is not stored locally.
+        aggregator: An AggregatorClient used instead of bohita_client when records go through a per-host aggregator.
         buffers: A list of data buffers.
-        thread: The thread responsible for sending data from the buffers.
+        next_flush: The time.monotonic() value at which the registry next flushes this pipeline.
+        lock: A lock guarding the buffers list. Never held while sending, so registering a buffer does not wait on the network.
+        flush_lock: A lock serialising flushes, so close waits for a flush already in progress.
+        pending (collections.OrderedDict): Records still in the buffers, by bohita_logos_shift_id, so feedback can be merged into them.
+        sent_datasets (collections.OrderedDict): The dataset of recently sent records, by bohita_logos_shift_id, to tag late feedback.
+        index_lock: A lock guarding pending and sent_datasets. Taken after a buffer's lock, never before.
     """
 
-    _instance = None
-    lock = threading.Lock()
-
     def __init__(
         self,
         bohita_client: BohitaClient,
         check_seconds: int = CHECK_SECONDS,
         filename: Optional[Union[str, Path]] = None,
+        aggregator_socket: Optional[Union[str, Path]] = None,
     ):
         self.bohita_client = bohita_client
         self.check_seconds = check_seconds
         self.open_handle(filename)
+        self.aggregator = None
+        if aggregator_socket:
+            from .aggregator import AggregatorClient
+
+            self.aggregator = AggregatorClient(aggregator_socket)
         self.buffers = []
-        self.thread = threading.Thread(target=self.send_data_from_buffers, daemon=True)
-        self.thread.start()
-        logger.info("BufferManager: Initialized and sending thread started.")
+        self.next_flush = time.monotonic() + check_seconds
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending, self.sent_datasets = OrderedDict(), OrderedDict()
+        self.index_lock = threading.Lock()
+        logger.info("BufferManager: Initialized.")
+
+    def _after_fork_in_child(self):
+        # Records still buffered belong to the parent, which will send them.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.buffers = []
+        self.pending, self.sent_datasets = OrderedDict(), OrderedDict()
+        self.index_lock = threading.Lock()
+        if self.aggregator:
+            self.aggregator.close()
 
     def open_handle(self, filename: str):
         if filename:
@@ -69,6 +100,13 @@ class BufferManager(metaclass=SingletonMeta):
         else:
             self.file_handle = None
 
+    def close(self):
+        self.flush()
+        if self.file_handle:
+            self.file_handle.close()
+            self.file_handle = None
+            logger.debug("Buffered file handle closed")
+
     def __del__(self):
         if self.file_handle:
             self.file_handle.close()
@@ -84,26 +122,291 @@ class BufferManager(metaclass=SingletonMeta):
             )
             logger.exception(e)
 
-    @retry(wait=wait_fixed(3))
     def send_data(self, data, dataset="default"):
-        logger.info(f"BufferManager: Sending data to dataset {dataset}. Data: {data}")
-        self.bohita_client.post_instrumentation_data(data, dataset)
+        if self.aggregator and self.aggregator.send(data):
+            logger.debug(f"BufferManager: Handed data for {dataset} to aggregator")
+        else:
+            logger.info(
+                f"BufferManager: Sending data to dataset {dataset}. Data: {data}"
+            )
+            self.bohita_client.post_instrumentation_data(data, dataset)
         self._write_to_local(data)
 
-    def send_data_from_buffers(self):
-        while True:
-            time.sleep(self.check_seconds)
-            for buffer in self.buffers:
-                with buffer["lock"]:
-                    if buffer["data"]:
-                        data_to_send = list(buffer["data"])
-                        buffer["data"].clear()
-                        for item in data_to_send:
-                            logger.debug(f"Sending {item}")
-                            self.send_data(item, dataset=item["dataset"])
+    def _send_buffer(self, buffer):
+        # Only drain under the buffer's lock, so capturing threads never wait on the network.
+        with buffer["lock"]:
+            if not buffer["data"]:
+                return
+            data_to_send = list(buffer["data"])
+            buffer["data"].clear()
+        # Before sending, so feedback merged from now on goes out on its own.
+        self._mark_sent(data_to_send)
+        for item in data_to_send:
+            logger.debug(f"Sending {item}")
+            try:
+                self.send_data(item, dataset=item["dataset"])
+            except Exception as e:
+                logger.error("BufferManager: Dropping record that could not be sent")
+                logger.exception(e)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                buffers = list(self.buffers)
+            for buffer in buffers:
+                self._send_buffer(buffer)
+
+    def _track_sent(self, bohita_logos_shift_id, dataset):
+        self.sent_datasets[bohita_logos_shift_id] = dataset
+        if len(self.sent_datasets) > MAX_TRACKED_IDS:
+            self.sent_datasets.popitem(last=False)
+
+    def _mark_sent(self, records):
+        with self.index_lock:
+            for record in records:
+                output = record.get("output")
+                if isinstance(output, dict):
+                    bohita_logos_shift_id = output.get("bohita_logos_shift_id")
+                    if self.pending.pop(bohita_logos_shift_id, None) is not None:
+                        self._track_sent(bohita_logos_shift_id, record["dataset"])
+
+    def track_pending(self, bohita_logos_shift_id, record):
+        """
+        Remembers a buffered record so feedback can be merged into it.
+
+        Must be called with the lock of the buffer holding the record, so the record
+        cannot be drained before it is tracked.
+
+        Args:
+            bohita_logos_shift_id (str): The unique identifier for the function call.
+            record (dict): The record, as appended to the buffer.
+        """
+        with self.index_lock:
+            self.pending[bohita_logos_shift_id] = record
+            if len(self.pending) > MAX_TRACKED_IDS:
+                # Feedback for the evicted record is sent on its own
+                evicted_id, evicted = self.pending.popitem(last=False)
+                self._track_sent(evicted_id, evicted["dataset"])
+
+    def merge_feedback(self, bohita_logos_shift_id, feedback):
+        """
+        Adds feedback to a record that has not been sent yet.
+
+        Args:
+            bohita_logos_shift_id (str): The unique identifier for the function call.
+            feedback (str): The feedback string.
+
+        Returns:
+            bool: True if the feedback was merged, False if the record is not pending.
+        """
+        with self.index_lock:
+            record = self.pending.get(bohita_logos_shift_id)
+            if record is None:
+                return False
+            record["feedback"] = feedback
+            return True
+
+    def sent_dataset(self, bohita_logos_shift_id):
+        """Returns the dataset of a recently sent record, or "unknown"."""
+        with self.index_lock:
+            return self.sent_datasets.get(bohita_logos_shift_id, "unknown")
 
     def register_buffer(self, buffer, lock):
-        self.buffers.append({"data": buffer, "lock": lock})
+        """
+        Starts flushing a buffer.
+
+        Args:
+            buffer (collections.deque): The buffer to flush.
+            lock (threading.Lock): The lock guarding the buffer.
+        """
+        with self.lock:
+            self.buffers.append({"data": buffer, "lock": lock})
+
+    def unregister_buffer(self, buffer):
+        """Stops flushing a buffer, sending whatever it still holds first."""
+        with self.lock:
+            for entry in self.buffers:
+                if entry["data"] is buffer:
+                    self.buffers.remove(entry)
+                    break
+            else:
+                return
+        self._send_buffer(entry)
+
+
+class PipelineRegistry:
+    """
+    Keeps one BufferManager per configuration and flushes all of them from a single shared thread.
+
+    Pipelines are reference counted: each LogosShift acquires one on construction and
+    releases it on close, and a pipeline is flushed and dropped when its last user is gone.
+
+    Attributes:
+        pipelines (dict): Active BufferManagers keyed by configuration.
+        refcounts (dict): The number of users of each pipeline, by the same key.
+        lock (threading.Lock): A lock guarding pipelines and refcounts.
+        wakeup (threading.Event): Set to make the thread reschedule, e.g. after a new pipeline is added.
+        thread (Optional[threading.Thread]): The thread flushing the pipelines, started on the first captured record.
+        releases (collections.deque): Buffers of garbage-collected LogosShift instances waiting to be released.
+    """
+
+    def __init__(self):
+        self.pipelines = {}
+        self.refcounts = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.releases = deque()
+
+    @staticmethod
+    def _key(api_key, bohita_client, check_seconds, filename, aggregator_socket):
+        return (
+            bohita_client if bohita_client else api_key,
+            check_seconds,
+            str(Path(filename).absolute()) if filename else None,
+            str(aggregator_socket) if aggregator_socket else None,
+        )
+
+    def acquire(
+        self,
+        api_key,
+        bohita_client=None,
+        check_seconds=CHECK_SECONDS,
+        filename=None,
+        aggregator_socket=None,
+    ):
+        """
+        Returns the pipeline for a configuration, creating it if needed.
+
+        Args:
+            api_key (str): The API key for the Bohita platform. Used when bohita_client is not provided.
+            bohita_client (Optional[BohitaClient]): An optional instance of BohitaClient. Pipelines are shared per client instance.
+            check_seconds (int): The interval in seconds between flushes.
+            filename (Optional[Union[str, Path]]): The file path for local data storage.
+            aggregator_socket (Optional[Union[str, Path]]): The Unix domain socket of a per-host aggregator.
+
+        Returns:
+            BufferManager: The pipeline for this configuration.
+        """
+        key = self._key(
+            api_key, bohita_client, check_seconds, filename, aggregator_socket
+        )
+        with self.lock:
+            if key not in self.pipelines:
+                self.pipelines[key] = BufferManager(
+                    bohita_client=bohita_client or BohitaClient(api_key=api_key),
+                    check_seconds=check_seconds,
+                    filename=filename,
+                    aggregator_socket=aggregator_socket,
+                )
+                self.refcounts[key] = 0
+                logger.info(f"PipelineRegistry: {len(self.pipelines)} active pipelines")
+            self.refcounts[key] += 1
+            buffer_manager = self.pipelines[key]
+        self.wakeup.set()
+        return buffer_manager
+
+    def release(self, buffer_manager):
+        """Drops one user of a pipeline, flushing and closing it when it was the last."""
+        with self.lock:
+            for key, pipeline in self.pipelines.items():
+                if pipeline is buffer_manager:
+                    break
+            else:
+                return
+            self.refcounts[key] -= 1
+            if self.refcounts[key] > 0:
+                return
+            del self.pipelines[key], self.refcounts[key]
+        buffer_manager.close()
+        logger.info("PipelineRegistry: Pipeline closed")
+
+    def release_buffers(self, buffer_manager, buffers):
+        """Unregisters buffers from a pipeline, sending what they still hold, and drops one user of it."""
+        for buffer in buffers:
+            buffer_manager.unregister_buffer(buffer)
+        self.release(buffer_manager)
+
+    def release_later(self, buffer_manager, buffers):
+        # Called from a finalizer, which may run in any thread and with any lock
+        # held, so only queue the work for the sending thread.
+        self.releases.append((buffer_manager, buffers))
+        self.wakeup.set()
+
+    def process_releases(self):
+        while True:
+            try:
+                buffer_manager, buffers = self.releases.popleft()
+            except IndexError:
+                return
+            self.release_buffers(buffer_manager, buffers)
+
+    def ensure_started(self):
+        """Starts the sending thread unless it is already running. Called on the first captured record."""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.start()
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.send_data_from_pipelines, daemon=True
+        )
+        self.thread.start()
+        logger.info("PipelineRegistry: Sending thread started.")
+
+    def send_data_from_pipelines(self):
+        while True:
+            try:
+                self.process_releases()
+            except Exception as e:
+                logger.error("PipelineRegistry: Releasing a pipeline failed")
+                logger.exception(e)
+            with self.lock:
+                pipelines = list(self.pipelines.values())
+            now = time.monotonic()
+            timeout = None
+            for pipeline in pipelines:
+                if pipeline.next_flush <= now:
+                    try:
+                        pipeline.flush()
+                    except Exception as e:
+                        logger.error("PipelineRegistry: Flushing a pipeline failed")
+                        logger.exception(e)
+                    pipeline.next_flush = time.monotonic() + pipeline.check_seconds
+                wait = pipeline.next_flush - time.monotonic()
+                timeout = wait if timeout is None else min(timeout, wait)
+            self.wakeup.wait(None if timeout is None else max(timeout, 0))
+            self.wakeup.clear()
+
+    def _after_fork_in_child(self):
+        # The sending thread does not survive fork.
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        for pipeline in self.pipelines.values():
+            pipeline._after_fork_in_child()
+        started, self.thread = self.thread is not None, None
+        if started and self.pipelines:
+            self.start()
+            logger.info(
+                f"PipelineRegistry: Restarted sending thread in child {os.getpid()}"
+            )
+
+
+pipeline_registry = PipelineRegistry()
+
+# LogosShift instances alive in this process, so their state can be reset after fork.
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    pipeline_registry._after_fork_in_child()
+    for logos_shift in list(_instances):
+        logos_shift._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
 
 
 class LogosShift:
@@ -121,7 +424,7 @@ class LogosShift:
         buffer_B (collections.deque): The second data buffer.
         active_buffer (collections.deque): The currently active data buffer.
         lock (threading.Lock): A lock to ensure thread-safety when modifying the buffers.
-        buffer_manager (BufferManager): The manager for handling data buffers and sending data.
+        buffer_manager (BufferManager): The pipeline for handling data buffers and sending data, shared with other instances of the same configuration.
         router (APIRouter): The router for determining which API to call based on the function and user.
 
     Examples:
@@ -157,6 +460,13 @@ class LogosShift:
 
         To disable sending data to Bohita:
         >>> logos_shift = LogosShift(api_key=None, filename="api_calls.log")
+
+        To send data through a per-host aggregator (see logos_shift_client.aggregator):
+        >>> logos_shift = LogosShift(api_key="YOUR_API_KEY", aggregator_socket="/tmp/logos_shift.sock")
+
+        To flush and release the pipeline when done:
+        >>> with LogosShift(api_key="YOUR_API_KEY") as logos_shift:
+        ...     result = add(1, 2)
     """
 
     def __init__(
@@ -167,6 +477,7 @@ class LogosShift:
         max_entries=MAX_ENTRIES,
         check_seconds=CHECK_SECONDS,
         filename=None,
+        aggregator_socket=None,
     ):
         """
         Initializes a new instance of LogosShift.
@@ -178,37 +489,83 @@ class LogosShift:
             max_entries (int): The maximum number of entries to store in a buffer before switching to the next buffer. Default is 10.
             check_seconds (int): The interval in seconds between checks to send data from the buffers. Default is 5.
             filename (Optional[Union[str, Path]]): The file path for local data storage. If None, data is not stored locally.
+            aggregator_socket (Optional[Union[str, Path]]): The Unix domain socket of a per-host aggregator. If set, records are handed to the aggregator instead of being sent from this process.
 
         Examples:
             >>> logos_shift = LogosShift(api_key="YOUR_API_KEY")
             >>> logos_shift = LogosShift(api_key="YOUR_API_KEY", filename="api_calls.log")
         """
         self.max_entries = max_entries
-        self.bohita_client = (
-            bohita_client if bohita_client else BohitaClient(api_key=api_key)
-        )
         self.buffer_A, self.buffer_B = deque(), deque()
         self.active_buffer = self.buffer_A
         self.lock = threading.Lock()
-        self.buffer_manager = BufferManager(
-            bohita_client=self.bohita_client,
+        self.buffer_manager = pipeline_registry.acquire(
+            api_key=api_key,
+            bohita_client=bohita_client,
             check_seconds=check_seconds,
             filename=filename,
+            aggregator_socket=aggregator_socket,
         )
+        self.bohita_client = self.buffer_manager.bohita_client
         self.buffer_manager.register_buffer(self.buffer_A, self.lock)
         self.buffer_manager.register_buffer(self.buffer_B, self.lock)
         self.router = router if router else APIRouter(bohita_client=self.bohita_client)
+        # Instances dropped without close() still release their pipeline once collected.
+        self._finalizer = weakref.finalize(
+            self,
+            pipeline_registry.release_later,
+            self.buffer_manager,
+            (self.buffer_A, self.buffer_B),
+        )
+        self._finalizer.atexit = False
+        _instances.add(self)
         logger.info("LogosShift: Initialized.")
 
+    def _after_fork_in_child(self):
+        self.lock = threading.Lock()
+        self.buffer_A.clear()
+        self.buffer_B.clear()
+        self.active_buffer = self.buffer_A
+        if isinstance(self.bohita_client, BohitaClient):
+            self.bohita_client.reset_connections()
+        self.buffer_manager.register_buffer(self.buffer_A, self.lock)
+        self.buffer_manager.register_buffer(self.buffer_B, self.lock)
+
+    def close(self):
+        """
+        Sends any buffered data and releases this instance's pipeline.
+
+        The instance must not be used to capture data afterwards.
+
+        Examples:
+            >>> logos_shift.close()
+        """
+        if self._finalizer.detach() is None:
+            return
+        _instances.discard(self)
+        pipeline_registry.release_buffers(
+            self.buffer_manager, (self.buffer_A, self.buffer_B)
+        )
+        logger.info("LogosShift: Closed.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def handle_data(self, result, dataset, args, kwargs, metadata):
+        bohita_logos_shift_id = None
         if isinstance(result, dict):
-            result["bohita_logos_shift_id"] = str(uuid.uuid4())
+            bohita_logos_shift_id = str(uuid.uuid4())
+            result["bohita_logos_shift_id"] = bohita_logos_shift_id
         data = {
             "input": (args, kwargs),
             "output": result,
             "dataset": dataset,
             "metadata": metadata,
         }
+        pipeline_registry.ensure_started()
         with self.lock:
             # Switch buffers if necessary
             if len(self.active_buffer) >= self.max_entries:
@@ -218,6 +575,8 @@ class LogosShift:
                 else:
                     self.active_buffer = self.buffer_A
             self.active_buffer.append(data)
+            if bohita_logos_shift_id:
+                self.buffer_manager.track_pending(bohita_logos_shift_id, data)
             logger.debug("Added data to active buffer")
         return result
 
@@ -237,6 +596,22 @@ class LogosShift:
 
         return func_to_call, args, kwargs, metadata
 
+    async def _wrap_common(self, func, dataset, *args, **kwargs):
+        logger.debug(
+            f"LogosShift: Wrapping async function {func.__name__}. Args: {args}, Kwargs: {kwargs}"
+        )
+        metadata = kwargs.pop("logos_shift_metadata", {})
+        metadata["function"] = func.__name__
+
+        if self.router:
+            func_to_call = await self.router.get_api_to_call_async(
+                func, metadata.get("user_id", None)
+            )
+        else:
+            func_to_call = func
+
+        return func_to_call, args, kwargs, metadata
+
     def wrap_function(self, func, dataset, *args, **kwargs):
         func_to_call, args, kwargs, metadata = self._wrap_common_sync(
             func, dataset, *args, **kwargs
@@ -252,7 +627,7 @@ class LogosShift:
             def sync_inner(*args, **kwargs):
                 return self.wrap_function(func, dataset, *args, **kwargs)
 
-            if asyncio.iscoroutinefunction(func):
+            if _is_coroutine_function(func):
                 return async_inner
             else:
                 return sync_inner
@@ -277,7 +652,7 @@ class LogosShift:
             def sync_inner(*args, **kwargs):
                 return self.wrap_function(func, dataset, *args, **kwargs)
 
-            if asyncio.iscoroutinefunction(func):
+            if _is_coroutine_function(func):
                 return async_inner
             else:
                 return sync_inner
@@ -288,6 +663,11 @@ class LogosShift:
         """
         Provides feedback for a specific function call.
 
+        If the call has not been sent yet, the feedback is merged into its record.
+        Otherwise it is sent with the next flush, tagged with the call's dataset
+        when it is still known. Either works from any instance sharing the call's
+        pipeline, not only the one that captured it.
+
         Args:
             bohita_logos_shift_id (str): The unique identifier for the function call.
             feedback (str): The feedback string.
@@ -295,10 +675,14 @@ class LogosShift:
         Examples:
             >>> logos_shift.provide_feedback("unique_id_123", "success")
         """
-        feedback_data = {
-            "bohita_logos_shift_id": bohita_logos_shift_id,
-            "feedback": feedback,
-            "dataset": "unknown",
-        }
+        pipeline_registry.ensure_started()
         with self.lock:
+            if self.buffer_manager.merge_feedback(bohita_logos_shift_id, feedback):
+                logger.debug("Merged feedback into pending record")
+                return
+            feedback_data = {
+                "bohita_logos_shift_id": bohita_logos_shift_id,
+                "feedback": feedback,
+                "dataset": self.buffer_manager.sent_dataset(bohita_logos_shift_id),
+            }
             self.active_buffer.append(feedback_data)
@@ -1,7 +1,6 @@
 import hashlib
 import logging
 import random
-import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +69,8 @@ class APIRouter:
             logger.warning("If the problem persists, this instance might be stale")
 
     def _get_configuration(self):
+        import asyncio
+
         asyncio.run(self._get_configuration_common(False))
 
     async def _get_configuration_async(self):
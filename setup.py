@@ -16,7 +16,6 @@ setup(
     install_requires=[
         "requests",
         "asyncio",
-        "tenacity",
         "httpx",
     ],
     extras_require={"dev": ["pytest", "ruff>=0.1.2", "bump2version==1.0.1"]},
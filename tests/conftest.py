@@ -0,0 +1,18 @@
+import time
+
+# Mock for the send_data function to capture data
+mock_data_buffer = []
+
+
+def mock_send_data(data, dataset="default"):
+    print(f"Sending ({data}, {dataset})")
+    mock_data_buffer.append((data, dataset))
+
+
+def wait_for_data(buffer, timeout=20):
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        if buffer:
+            return True
+        time.sleep(0.1)  # Check every 100 milliseconds
+    return False
@@ -0,0 +1,116 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from conftest import mock_data_buffer, mock_send_data, wait_for_data
+
+from logos_shift_client import LogosShift
+from logos_shift_client.aggregator import Aggregator, AggregatorClient
+
+
+@pytest.fixture
+def aggregator(tmp_path, monkeypatch):
+    logos_shift = LogosShift(api_key="YOUR_API_KEY", max_entries=1, check_seconds=0.5)
+    buffer_manager = logos_shift.buffer_manager
+    monkeypatch.setattr(buffer_manager, "send_data", mock_send_data)
+    aggregator = Aggregator(tmp_path / "logos_shift.sock", buffer_manager)
+    threading.Thread(target=aggregator.serve_forever, daemon=True).start()
+    yield aggregator
+    aggregator.shutdown()
+    buffer_manager.unregister_buffer(aggregator.buffer)
+    logos_shift.close()
+
+
+def test_records_reach_buffer_manager(aggregator):
+    mock_data_buffer.clear()
+    client = AggregatorClient(aggregator.socket_path)
+    record = {"input": [[1, 2], {}], "output": 3, "dataset": "agg", "metadata": {}}
+
+    assert client.send(record)
+    assert wait_for_data(mock_data_buffer), "Timeout waiting for data"
+    assert mock_data_buffer[0] == (record, "agg")
+    client.close()
+
+
+def test_invalid_records_are_dropped(aggregator):
+    mock_data_buffer.clear()
+    client = AggregatorClient(aggregator.socket_path)
+    record = {"output": 3, "dataset": "agg"}
+
+    for invalid in ({"no_dataset": 1}, {"dataset": 1}, [1, 2], "text"):
+        assert client.send(invalid)
+    assert client.send(record)
+    assert wait_for_data(mock_data_buffer), "Timeout waiting for data"
+    assert mock_data_buffer == [(record, "agg")]
+    client.close()
+
+
+def test_refuses_to_replace_regular_file(tmp_path):
+    path = tmp_path / "important.txt"
+    path.write_text("keep me")
+    with pytest.raises(RuntimeError):
+        Aggregator(path, buffer_manager=None)
+    assert path.read_text() == "keep me"
+
+
+def test_unreachable_aggregator(tmp_path):
+    client = AggregatorClient(tmp_path / "missing.sock")
+    assert not client.send({"dataset": "default"})
+
+
+def test_refuses_to_replace_live_socket(aggregator):
+    with pytest.raises(RuntimeError):
+        Aggregator(aggregator.socket_path, buffer_manager=None)
+
+
+def test_sigterm_flushes_pending_records(tmp_path):
+    socket_path, filename = tmp_path / "logos_shift.sock", tmp_path / "calls.log"
+    env = {k: v for k, v in os.environ.items() if k != "BOHITA_API_KEY"}
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "logos_shift_client.aggregator",
+            "--socket",
+            str(socket_path),
+            "--check-seconds",
+            "3600",
+            "--filename",
+            str(filename),
+        ],
+        env=env,
+    )
+    try:
+        client = AggregatorClient(socket_path)
+        start_time = time.time()
+        while not client.send({"output": 3, "dataset": "agg"}):
+            assert time.time() - start_time < 20, "Aggregator did not start"
+            time.sleep(0.1)
+        client.close()
+        time.sleep(0.5)
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=20) == 0
+    finally:
+        proc.kill()
+
+    assert "'dataset': 'agg'" in filename.read_text()
+    assert not socket_path.exists()
+
+
+def test_stalled_aggregator_times_out(tmp_path):
+    socket_path = tmp_path / "stalled.sock"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(socket_path))
+    listener.listen()  # Accepts connections but never reads from them
+    try:
+        client = AggregatorClient(socket_path, timeout=0.2)
+        start_time = time.time()
+        assert not client.send({"dataset": "default", "output": "x" * 10_000_000})
+        assert time.time() - start_time < 5
+    finally:
+        listener.close()
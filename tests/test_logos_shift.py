@@ -1,9 +1,17 @@
+import gc
 import logging
+import os
+import subprocess
+import sys
+import threading
 import time
+import weakref
 
 import pytest
+from conftest import mock_data_buffer, mock_send_data, wait_for_data
 
 from logos_shift_client import LogosShift
+from logos_shift_client.logos_shift import _instances, pipeline_registry
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -16,30 +24,12 @@ ch.setFormatter(formatter)
 logger.addHandler(ch)
 
 
-# Mock for the send_data function to capture data
-mock_data_buffer = []
-
-
-def mock_send_data(data, dataset="default"):
-    print(f"Sending ({data}, {dataset})")
-    mock_data_buffer.append((data, dataset))
-
-
-def wait_for_data(buffer, timeout=20):
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if buffer:
-            return True
-        time.sleep(0.1)  # Check every 100 milliseconds
-    return False
-
-
 @pytest.fixture
-def setup_logos_shift():
+def setup_logos_shift(monkeypatch):
     logos_shift = LogosShift(api_key="YOUR_API_KEY", max_entries=1, check_seconds=0.5)
 
     # Override the actual send_data method with our mock for testing
-    logos_shift.buffer_manager.send_data = mock_send_data
+    monkeypatch.setattr(logos_shift.buffer_manager, "send_data", mock_send_data)
 
     print(
         "config: ",
@@ -47,7 +37,8 @@ def setup_logos_shift():
         logos_shift.buffer_manager.check_seconds,
         logos_shift.buffer_manager.send_data,
     )
-    return logos_shift
+    yield logos_shift
+    logos_shift.close()
 
 
 def test_basic_function_call(setup_logos_shift):
@@ -91,3 +82,252 @@ def test_dataset_parameter(setup_logos_shift):
     assert any(
         item[1] == "test_dataset" for item in mock_data_buffer
     ), "Expected dataset not found in mock_data_buffer"
+
+
+def test_async_function_call(setup_logos_shift):
+    import asyncio
+
+    @setup_logos_shift(dataset="async_dataset")
+    async def add_async(x, y):
+        return x + y
+
+    mock_data_buffer.clear()
+    result = asyncio.run(add_async(1, 2))
+    assert result == 3
+
+    assert wait_for_data(mock_data_buffer), "Timeout waiting for data"
+    assert any(
+        item[1] == "async_dataset" for item in mock_data_buffer
+    ), "Expected dataset not found in mock_data_buffer"
+
+
+def test_marked_coroutine_function_is_awaited(setup_logos_shift):
+    import asyncio
+    import asyncio.coroutines
+
+    marker = getattr(asyncio.coroutines, "_is_coroutine", None)
+    if marker is None:
+        pytest.skip("asyncio has no _is_coroutine marker")
+
+    async def add_async(x, y):
+        return x + y
+
+    def add(x, y):
+        return add_async(x, y)
+
+    add._is_coroutine = marker
+
+    mock_data_buffer.clear()
+    assert asyncio.run(setup_logos_shift()(add)(1, 2)) == 3
+    assert wait_for_data(mock_data_buffer), "Timeout waiting for data"
+    assert mock_data_buffer[0][0]["output"] == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_buffer_manager_restarts_after_fork(setup_logos_shift):
+    setup_logos_shift.handle_data({"value": 1}, "default", (), {}, {})
+
+    pid = os.fork()
+    if pid == 0:
+        buffer_manager = setup_logos_shift.buffer_manager
+        healthy = (
+            pipeline_registry.thread.is_alive()
+            and not setup_logos_shift.buffer_A
+            and not setup_logos_shift.buffer_B
+            and len(buffer_manager.buffers) >= 2
+        )
+        # A record captured in the child must actually be sent by the child
+        mock_data_buffer.clear()
+        setup_logos_shift.handle_data({"value": 2}, "child", (), {}, {})
+        delivered = wait_for_data(mock_data_buffer, timeout=5) and any(
+            dataset == "child" for _, dataset in mock_data_buffer
+        )
+        os._exit(0 if healthy and delivered else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0, "Child did not deliver a captured record"
+
+
+def test_pipelines_are_keyed_by_configuration(tmp_path):
+    first = LogosShift(api_key="KEY_A", check_seconds=0.5)
+    same = LogosShift(api_key="KEY_A", check_seconds=0.5)
+    other_key = LogosShift(api_key="KEY_B", check_seconds=0.5)
+    other_file = LogosShift(
+        api_key="KEY_A", check_seconds=0.5, filename=tmp_path / "calls.log"
+    )
+
+    assert first.buffer_manager is same.buffer_manager
+    assert first.buffer_manager is not other_key.buffer_manager
+    assert first.buffer_manager is not other_file.buffer_manager
+    assert other_file.buffer_manager.file_handle is not None
+    assert first.buffer_manager.file_handle is None
+
+    for logos_shift in (first, same, other_key, other_file):
+        logos_shift.close()
+
+
+def test_close_flushes_and_releases_pipeline(tmp_path):
+    filename = tmp_path / "calls.log"
+    with LogosShift(api_key=None, check_seconds=3600, filename=filename) as first:
+        second = LogosShift(api_key=None, check_seconds=3600, filename=filename)
+        buffer_manager = first.buffer_manager
+        assert len(buffer_manager.buffers) == 4
+
+        second.handle_data({"value": 1}, "default", (), {}, {})
+        second.close()
+        assert len(buffer_manager.buffers) == 2
+        assert buffer_manager in pipeline_registry.pipelines.values()
+
+    assert buffer_manager not in pipeline_registry.pipelines.values()
+    assert "'value': 1" in filename.read_text()
+
+
+def test_feedback_is_merged_into_pending_record(tmp_path):
+    with LogosShift(
+        api_key=None, check_seconds=3600, filename=tmp_path / "calls.log"
+    ) as logos_shift:
+        result = logos_shift.handle_data({"value": 1}, "sales", (), {}, {})
+        logos_shift.provide_feedback(result["bohita_logos_shift_id"], "success")
+
+        records = list(logos_shift.buffer_A) + list(logos_shift.buffer_B)
+        assert len(records) == 1
+        assert records[0]["feedback"] == "success"
+
+
+def test_late_feedback_keeps_dataset(tmp_path):
+    with LogosShift(
+        api_key=None, check_seconds=3600, filename=tmp_path / "calls.log"
+    ) as logos_shift:
+        result = logos_shift.handle_data({"value": 1}, "sales", (), {}, {})
+        logos_shift.buffer_manager.flush()
+        assert not logos_shift.buffer_manager.pending
+
+        logos_shift.provide_feedback(result["bohita_logos_shift_id"], "success")
+        logos_shift.provide_feedback("unknown_id", "failure")
+
+        records = list(logos_shift.buffer_A) + list(logos_shift.buffer_B)
+        assert [record["dataset"] for record in records] == ["sales", "unknown"]
+
+
+def test_feedback_through_another_instance(tmp_path):
+    filename = tmp_path / "calls.log"
+    with LogosShift(api_key=None, check_seconds=3600, filename=filename) as first:
+        with LogosShift(api_key=None, check_seconds=3600, filename=filename) as second:
+            assert first.buffer_manager is second.buffer_manager
+            merged = first.handle_data({"value": 1}, "sales", (), {}, {})
+            late = first.handle_data({"value": 2}, "support", (), {}, {})
+            second.provide_feedback(merged["bohita_logos_shift_id"], "success")
+            first.buffer_manager.flush()
+            second.provide_feedback(late["bohita_logos_shift_id"], "failure")
+
+            sent = list(first.buffer_A) + list(first.buffer_B)
+            assert not sent
+            records = list(second.buffer_A) + list(second.buffer_B)
+            assert [record["dataset"] for record in records] == ["support"]
+
+    assert "'feedback': 'success'" in filename.read_text()
+
+
+def test_import_and_construction_are_lazy():
+    code = """
+import sys, threading
+from logos_shift_client import LogosShift
+from logos_shift_client.logos_shift import pipeline_registry
+
+logos_shift = LogosShift(api_key="YOUR_API_KEY")
+heavy = {"requests", "httpx", "asyncio"} & set(sys.modules)
+assert not heavy, heavy
+assert pipeline_registry.thread is None and threading.active_count() == 1
+
+logos_shift.handle_data({"value": 1}, "default", (), {}, {})
+assert pipeline_registry.thread.is_alive()
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_failing_pipeline_does_not_stop_others(monkeypatch):
+    def failing_send_data(data, dataset="default"):
+        raise TypeError("Object of type object is not JSON serializable")
+
+    failing = LogosShift(api_key="KEY_FAILING", check_seconds=0.1)
+    healthy = LogosShift(api_key="KEY_HEALTHY", check_seconds=0.1)
+    monkeypatch.setattr(failing.buffer_manager, "send_data", failing_send_data)
+    monkeypatch.setattr(healthy.buffer_manager, "send_data", mock_send_data)
+    mock_data_buffer.clear()
+
+    try:
+        failing.handle_data({"value": 1}, "default", (object(),), {}, {})
+        time.sleep(0.3)
+        healthy.handle_data({"value": 2}, "healthy", (), {}, {})
+
+        assert wait_for_data(mock_data_buffer), "Healthy pipeline stalled"
+        assert mock_data_buffer[0][1] == "healthy"
+        assert pipeline_registry.thread.is_alive()
+        assert failing.lock.acquire(timeout=1), "Failing pipeline kept its lock"
+        failing.lock.release()
+    finally:
+        failing.close()
+        healthy.close()
+
+
+def test_pipeline_does_not_keep_instance_alive():
+    logos_shift = LogosShift(api_key="KEY_DROPPED", check_seconds=3600)
+    logos_shift.handle_data({"value": 1}, "default", (), {}, {})
+    ref = weakref.ref(logos_shift)
+
+    del logos_shift
+    gc.collect()
+    assert ref() is None
+
+
+def test_dropped_instances_release_their_pipeline(tmp_path):
+    def wait_for(condition, timeout=5):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            pipeline_registry.process_releases()
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+
+    config = {"api_key": None, "check_seconds": 3600, "filename": tmp_path / "a.log"}
+    keep = LogosShift(**config)
+    buffer_manager = keep.buffer_manager
+    for i in range(100):
+        logos_shift = LogosShift(**config)
+        logos_shift.handle_data({"value": i}, "default", (), {}, {})
+    del logos_shift
+    gc.collect()
+
+    assert wait_for(lambda: len(buffer_manager.buffers) == 2)
+    key = next(k for k, v in pipeline_registry.pipelines.items() if v is buffer_manager)
+    assert pipeline_registry.refcounts[key] == 1
+    assert [x for x in _instances if x.buffer_manager is buffer_manager] == [keep]
+
+    del keep
+    gc.collect()
+    assert wait_for(lambda: buffer_manager not in pipeline_registry.pipelines.values())
+    assert "'value': 99" in (tmp_path / "a.log").read_text()
+
+
+def test_slow_flush_does_not_block_construction(monkeypatch):
+    sending, unblock = threading.Event(), threading.Event()
+
+    def slow_send_data(data, dataset="default"):
+        sending.set()
+        unblock.wait(timeout=10)
+
+    first = LogosShift(api_key="KEY_SLOW", check_seconds=0.1)
+    monkeypatch.setattr(first.buffer_manager, "send_data", slow_send_data)
+    try:
+        first.handle_data({"value": 1}, "default", (), {}, {})
+        assert sending.wait(timeout=5), "Record was never sent"
+
+        start_time = time.time()
+        second = LogosShift(api_key="KEY_SLOW", check_seconds=0.1)
+        assert second.buffer_manager is first.buffer_manager
+        second.close()
+        assert time.time() - start_time < 1, "Construction or close waited on a flush"
+    finally:
+        unblock.set()
+        first.close()